@@ -29,12 +29,14 @@
 
 
 import re
+import functools
 import logging
-import itertools
+import io
 import os
-import imp
+import importlib.util
 import html.parser
 import hashlib
+import binascii
 
 from enum import Enum
 
@@ -42,11 +44,17 @@ from .util import TrackSubClasses
 
 logger = logging.getLogger(__name__)
 
+_UNSET = object()
+
 
 class FilterBase(object, metaclass=TrackSubClasses):
     __subclasses__ = {}
     __anonymous_subclasses__ = []
 
+    # Filters whose filter() never reads self.job/self.state can set
+    # this to share a single instance across all process() calls
+    IS_STATELESS = False
+
     def __init__(self, job, state):
         self.job = job
         self.state = state
@@ -64,13 +72,25 @@ class FilterBase(object, metaclass=TrackSubClasses):
             ))
         return '\n'.join(result)
 
+    # Caches the sorted filter class list for auto_process, keyed by the
+    # registry sizes so filters registered later (e.g. from hooks files)
+    # invalidate it
+    _filter_list_cache = (None, None)
+
     @classmethod
-    def auto_process(cls, state, data):
-        filters = itertools.chain((filtercls for _, filtercls in
-                                   sorted(cls.__subclasses__.items(), key=lambda k_v: k_v[0])),
-                                  cls.__anonymous_subclasses__)
+    def _filter_list(cls):
+        key = (len(cls.__subclasses__), len(cls.__anonymous_subclasses__))
+        cached_key, filters = cls._filter_list_cache
+        if key != cached_key:
+            filters = [filtercls for _, filtercls in
+                       sorted(cls.__subclasses__.items(), key=lambda k_v: k_v[0])]
+            filters.extend(cls.__anonymous_subclasses__)
+            cls._filter_list_cache = (key, filters)
+        return filters
 
-        for filtercls in filters:
+    @classmethod
+    def auto_process(cls, state, data):
+        for filtercls in cls._filter_list():
             filter_instance = filtercls(state.job, state)
             if filter_instance.match():
                 logger.info('Auto-applying filter %r to %s', filter_instance, state.job.get_location())
@@ -84,7 +104,16 @@ class FilterBase(object, metaclass=TrackSubClasses):
         filtercls = cls.__subclasses__.get(filter_kind, None)
         if filtercls is None:
             raise ValueError('Unknown filter kind: %s:%s' % (filter_kind, subfilter))
-        return filtercls(state.job, state).filter(data, subfilter)
+        if filtercls.IS_STATELESS:
+            # Looked up on the class itself so subclasses never share a
+            # parent's singleton
+            instance = filtercls.__dict__.get('_instance')
+            if instance is None:
+                instance = filtercls(None, None)
+                filtercls._instance = instance
+        else:
+            instance = filtercls(state.job, state)
+        return instance.filter(data, subfilter)
 
     def match(self):
         return False
@@ -97,12 +126,35 @@ class AutoMatchFilter(FilterBase):
     """Automatically matches subclass filters with a given location"""
     MATCH = None
 
+    @classmethod
+    def _get_match_items(cls):
+        # Computed lazily on first use rather than in __init_subclass__,
+        # which older interpreters than 3.6 never invoke
+        items = cls.__dict__.get('_match_items')
+        if items is None:
+            items = tuple(cls.MATCH.items()) if cls.MATCH else ()
+            cls._match_items = items
+        return items
+
     def match(self):
-        if self.MATCH is None:
+        match_items = self._get_match_items()
+        if not match_items:
             return False
 
-        d = self.job.to_dict()
-        result = all(d.get(k, None) == v for k, v in self.MATCH.items())
+        # Probe job attributes directly and only pay for a full
+        # to_dict() if an attribute cannot be read that way
+        d = None
+        result = True
+        for k, v in match_items:
+            value = getattr(self.job, k, _UNSET)
+            if value is _UNSET:
+                if d is None:
+                    d = self.job.to_dict()
+                value = d.get(k, None)
+            if value != v:
+                result = False
+                break
+
         logger.debug('Matching %r with %r result: %r', self, self.job, result)
         return result
 
@@ -111,15 +163,33 @@ class RegexMatchFilter(FilterBase):
     """Same as AutoMatchFilter but matching is done with regexes"""
     MATCH = None
 
+    @classmethod
+    def _get_match_items(cls):
+        # Computed lazily on first use rather than in __init_subclass__,
+        # which older interpreters than 3.6 never invoke
+        items = cls.__dict__.get('_match_items')
+        if items is None:
+            if cls.MATCH:
+                # Normalize plain strings to compiled patterns once per
+                # class, so matching never recompiles per job
+                cls.MATCH = {k: re.compile(v) if isinstance(v, str) else v
+                             for k, v in cls.MATCH.items()}
+                items = tuple(cls.MATCH.items())
+            else:
+                items = ()
+            cls._match_items = items
+        return items
+
     def match(self):
-        if self.MATCH is None:
+        match_items = self._get_match_items()
+        if not match_items:
             return False
 
         d = self.job.to_dict()
 
         # It's a match if we have at least one key/value pair that matches,
         # and no key/value pairs that do not match
-        matches = [v.match(d[k]) for k, v in self.MATCH.items() if k in d]
+        matches = [v.match(d[k]) for k, v in match_items if k in d]
         result = len(matches) > 0 and all(matches)
         logger.debug('Matching %r with %r result: %r', self, self.job, result)
         return result
@@ -128,15 +198,31 @@ class RegexMatchFilter(FilterBase):
 class LegacyHooksPyFilter(FilterBase):
     FILENAME = os.path.expanduser('~/.urlwatch/lib/hooks.py')
 
+    # The hooks file is checked and loaded at most once per process,
+    # not once per job/filter instantiation
+    _hooks = None
+    _hooks_loaded = False
+
     def __init__(self, job, state):
         super().__init__(job, state)
 
-        self.hooks = None
-        if os.path.exists(self.FILENAME):
-            try:
-                self.hooks = imp.load_source('legacy_hooks', self.FILENAME)
-            except Exception as e:
-                logger.error('Could not load legacy hooks file: %s', e)
+        cls = LegacyHooksPyFilter
+        if not cls._hooks_loaded:
+            cls._hooks_loaded = True
+            if os.path.exists(self.FILENAME):
+                try:
+                    spec = importlib.util.spec_from_file_location('legacy_hooks', self.FILENAME)
+                    if hasattr(importlib.util, 'module_from_spec'):
+                        module = importlib.util.module_from_spec(spec)
+                        spec.loader.exec_module(module)
+                    else:
+                        # module_from_spec only exists on Python 3.5+
+                        module = spec.loader.load_module()
+                    cls._hooks = module
+                except Exception as e:
+                    logger.error('Could not load legacy hooks file: %s', e)
+
+        self.hooks = cls._hooks
 
     def match(self):
         return self.hooks is not None
@@ -157,6 +243,8 @@ class Html2TextFilter(FilterBase):
 
     __kind__ = 'html2text'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
 
         if subfilter is None:
@@ -177,23 +265,81 @@ class Ical2TextFilter(FilterBase):
 
     __kind__ = 'ical2text'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         self._no_subfilters(subfilter)
         from .ical2txt import ical2text
         return ical2text(data)
 
 
+@functools.lru_cache(maxsize=512)
+def _compile(pattern, flags=0):
+    """Compile a regex, reusing compiled patterns across filter runs"""
+    return re.compile(pattern, flags)
+
+
+_LINE_RE = re.compile(r'^.*$', re.MULTILINE)
+
+
+def _iterate_lines(data):
+    """Yield the lines of data without materializing them as a list
+
+    Lines are separated by '\\n' or '\\r\\n' with the terminator
+    stripped, as str.splitlines does for real-world text, matching the
+    '\\n'.join() used to build the filtered result.
+    """
+    for match in _LINE_RE.finditer(data):
+        # A trailing newline produces one final empty match that
+        # str.splitlines would not report as a line
+        if match.start() == len(data) and data.endswith('\n'):
+            break
+        line = match.group(0)
+        if line.endswith('\r'):
+            line = line[:-1]
+        yield line
+
+
+def _required_literal(subfilter):
+    """Return a literal substring that every match must contain, or None
+
+    Checking substring containment is much cheaper than running the regex
+    engine, so grep-style filters can use this to skip most non-matching
+    lines. Only simple patterns are analyzed; anything with alternation,
+    repetition, groups, classes or escapes is left to the regex engine.
+    """
+    if re.search(r'[*?{}()\[\]|\\]', subfilter):
+        return None
+
+    literal = max(re.split(r'[.^$+]', subfilter), key=len)
+    return literal if literal else None
+
+
+@functools.lru_cache(maxsize=512)
+def _line_matcher(subfilter):
+    """Build a per-line match predicate for a grep-style subfilter"""
+    pattern = _compile(subfilter)
+    literal = _required_literal(subfilter)
+    if literal is None:
+        return pattern.search
+
+    return lambda line: literal in line and pattern.search(line)
+
+
 class GrepFilter(FilterBase):
     """Filter only lines matching a regular expression"""
 
     __kind__ = 'grep'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         if subfilter is None:
             raise ValueError('The grep filter needs a regular expression')
 
-        return '\n'.join(line for line in data.splitlines()
-                         if re.search(subfilter, line) is not None)
+        matches = _line_matcher(subfilter)
+        return '\n'.join(line for line in _iterate_lines(data)
+                         if matches(line))
 
 
 class InverseGrepFilter(FilterBase):
@@ -201,12 +347,15 @@ class InverseGrepFilter(FilterBase):
 
     __kind__ = 'grepi'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         if subfilter is None:
             raise ValueError('The inverse grep filter needs a regular expression')
 
-        return '\n'.join(line for line in data.splitlines()
-                         if re.search(subfilter, line) is None)
+        matches = _line_matcher(subfilter)
+        return '\n'.join(line for line in _iterate_lines(data)
+                         if not matches(line))
 
 
 class StripFilter(FilterBase):
@@ -214,6 +363,8 @@ class StripFilter(FilterBase):
 
     __kind__ = 'strip'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         self._no_subfilters(subfilter)
         return data.strip()
@@ -230,33 +381,51 @@ class ElementsBy(html.parser.HTMLParser):
 
         self._filter_by = filter_by
         if self._filter_by == FilterBy.ATTRIBUTE:
-            self._attributes = {name: value}
+            self._attr_name = name
+            self._attr_value = value
         else:
             self._name = name
 
-        self._result = []
+        self._result = io.StringIO()
         self._inside = False
         self._elts = []
 
     def get_html(self):
-        return ''.join(self._result)
+        return self._result.getvalue()
 
-    def handle_starttag(self, tag, attrs):
-        ad = dict(attrs)
+    def _might_match(self, data):
+        """Cheap scan of the raw markup to see if a full parse can match"""
+        if self._filter_by == FilterBy.TAG:
+            return _compile('<%s' % re.escape(self._name), re.IGNORECASE).search(data) is not None
+
+        if self._attr_value is None:
+            return True
+        value = self._attr_value
 
-        if self._filter_by == FilterBy.ATTRIBUTE and all(ad.get(k, None) == v for k, v in self._attributes.items()):
-            self._inside = True
-        elif self._filter_by == FilterBy.TAG and tag == self._name:
-            self._inside = True
+        # Character references could hide the value from a literal scan,
+        # so only trust a miss if the document contains none
+        return value in data or '&' in data
+
+    def feed(self, data):
+        if self._might_match(data):
+            super().feed(data)
+
+    def handle_starttag(self, tag, attrs):
+        if not self._inside:
+            if self._filter_by == FilterBy.ATTRIBUTE:
+                self._inside = any(k == self._attr_name and v == self._attr_value
+                                   for k, v in attrs)
+            else:
+                self._inside = (tag == self._name)
 
         if self._inside:
-            self._result.append('<%s%s%s>' % (tag, ' ' if attrs else '',
-                                              ' '.join('%s="%s"' % (k, v) for k, v in attrs)))
+            attr_str = ' '.join('%s="%s"' % (k, v) for k, v in attrs)
+            self._result.write('<%s %s>' % (tag, attr_str) if attr_str else '<%s>' % (tag,))
             self._elts.append(tag)
 
     def handle_endtag(self, tag):
         if self._inside:
-            self._result.append('</%s>' % (tag,))
+            self._result.write('</%s>' % (tag,))
             if tag in self._elts:
                 t = self._elts.pop()
                 while t != tag and self._elts:
@@ -266,7 +435,7 @@ class ElementsBy(html.parser.HTMLParser):
 
     def handle_data(self, data):
         if self._inside:
-            self._result.append(data)
+            self._result.write(data)
 
 
 class GetElementById(FilterBase):
@@ -325,16 +494,44 @@ class GetElementByTag(FilterBase):
         return element_by_tag.get_html()
 
 
+# The usedforsecurity flag (needed for FIPS-restricted builds and to
+# let OpenSSL pick its fastest SHA-1 backend) only exists on Python 3.9+
+try:
+    hashlib.sha1(usedforsecurity=False)
+    _SHA1_KWARGS = {'usedforsecurity': False}
+except TypeError:
+    _SHA1_KWARGS = {}
+
+
 class Sha1Filter(FilterBase):
     """Calculate the SHA-1 checksum of the content"""
 
     __kind__ = 'sha1sum'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         self._no_subfilters(subfilter)
-        sha = hashlib.sha1()
-        sha.update(data.encode('utf-8', 'ignore'))
-        return sha.hexdigest()
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.encode('utf-8', 'ignore')
+        return hashlib.sha1(data, **_SHA1_KWARGS).hexdigest()
+
+
+# Maps printable ASCII to itself and everything else to '.' for the
+# character column of the hex dump
+_PRINTABLE = bytes(c if 32 <= c < 127 else 0x2e for c in range(256))
+
+# bytes.hex only grew its separator argument in Python 3.8 (and only
+# exists at all since 3.5)
+try:
+    b''.hex(' ')
+
+    def _spaced_hex(data):
+        return data.hex(' ')
+except (AttributeError, TypeError):
+    def _spaced_hex(data):
+        digits = binascii.hexlify(data).decode('ascii')
+        return ' '.join(digits[i:i + 2] for i in range(0, len(digits), 2))
 
 
 class HexdumpFilter(FilterBase):
@@ -342,10 +539,14 @@ class HexdumpFilter(FilterBase):
 
     __kind__ = 'hexdump'
 
+    IS_STATELESS = True
+
     def filter(self, data, subfilter=None):
         self._no_subfilters(subfilter)
-        data = bytearray(data.encode('utf-8', 'ignore'))
-        blocks = [data[i * 16:(i + 1) * 16] for i in range(int((len(data) + (16 - 1)) / 16))]
-        return '\n'.join('%s  %s' % (' '.join('%02x' % c for c in block),
-                                     ''.join((chr(c) if (c > 31 and c < 127) else '.')
-                                             for c in block)) for block in blocks)
+        raw = data.encode('utf-8', 'ignore')
+        # Render both columns for the whole buffer in one C-level pass
+        # each, then cut them into 16-byte lines by slicing
+        hex_col = _spaced_hex(raw)
+        ascii_col = raw.translate(_PRINTABLE).decode('ascii')
+        return '\n'.join('%s  %s' % (hex_col[i * 3:i * 3 + 47], ascii_col[i:i + 16])
+                         for i in range(0, len(raw), 16))
@@ -1,5 +1,8 @@
 from urlwatch.filters import GetElementById
 from urlwatch.filters import GetElementByTag
+from urlwatch.filters import GrepFilter
+from urlwatch.filters import InverseGrepFilter
+from urlwatch.filters import _required_literal
 
 from nose.tools import eq_
 
@@ -35,3 +38,49 @@ def test_get_element_by_tag_nested():
     """, 'div')
     print(result)
     eq_(result, """<div>foo</div><div>bar</div>""")
+
+
+def test_required_literal():
+    eq_(_required_literal('error'), 'error')
+    eq_(_required_literal('^hello$'), 'hello')
+    eq_(_required_literal('foo.bar'), 'foo')
+    eq_(_required_literal('colou?r'), None)
+    eq_(_required_literal('foo|bar'), None)
+    eq_(_required_literal('(foo)'), None)
+    eq_(_required_literal('[abc]'), None)
+    eq_(_required_literal('\\d+'), None)
+    eq_(_required_literal('.'), None)
+
+
+def test_grep():
+    grep = GrepFilter(None, None)
+    data = 'One foo\nTwo\nThree foos'
+    eq_(grep.filter(data, 'foo'), 'One foo\nThree foos')
+
+
+def test_grep_literal_still_required_with_metachars():
+    grep = GrepFilter(None, None)
+    data = 'caat\ncat\ncot\ncut'
+    eq_(grep.filter(data, 'ca+t'), 'caat\ncat')
+    eq_(grep.filter(data, 'c.t'), 'cat\ncot\ncut')
+
+
+def test_grep_regex_fallback():
+    grep = GrepFilter(None, None)
+    data = 'One foo\nTwo\nThree foos'
+    eq_(grep.filter(data, 'foo|Two'), 'One foo\nTwo\nThree foos')
+    eq_(grep.filter(data, 'foos?$'), 'One foo\nThree foos')
+
+
+def test_inverse_grep():
+    grepi = InverseGrepFilter(None, None)
+    data = 'One foo\nTwo\nThree foos'
+    eq_(grepi.filter(data, 'foo'), 'Two')
+    eq_(grepi.filter(data, 'foo|Two'), '')
+
+
+def test_grep_crlf_lines():
+    grep = GrepFilter(None, None)
+    data = 'One foo\r\nTwo\r\nThree foos\r\n'
+    eq_(grep.filter(data, 'foo'), 'One foo\nThree foos')
+    eq_(grep.filter(data, 'foos?$'), 'One foo\nThree foos')